@@ -0,0 +1,289 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from database import engine, get_db, StockData, StockSummary
+from rollups import ROLLUP_MODELS, PERIOD_START, aggregate_bars, next_period_start
+from screener import SCREENER_FIELDS, SUMMARY_WINDOW_DAYS, compute_summary, update_summary
+from series import OHLCVSeries
+from stock_service import initialize_database, fetch_live_stock_data, generate_mock_stock_data, get_start_date, window_start
+
+DEFAULT_CHECKPOINT_PATH = "backfill_checkpoint.log"
+
+# Fetched series waiting for the writer, per worker, before submission pauses
+MAX_PENDING_PER_WORKER = 4
+
+# Symbols written per transaction
+WRITE_BATCH_SIZE = 32
+
+# Workers are spawned rather than forked: inside the API the parent has executor
+# threads and pooled SQLite connections whose locks a fork would copy mid-use
+WORKER_CONTEXT = multiprocessing.get_context("spawn")
+
+# Column order of the rows workers prepare for the writer's executemany calls
+BAR_COLUMNS = ("company_symbol", "date", "open_price", "high_price", "low_price", "close_price", "volume")
+SUMMARY_COLUMNS = ("company_symbol", "latest_date") + tuple(SCREENER_FIELDS)
+
+# Renders datetimes exactly as SQLAlchemy stores them, so rows can skip its
+# per-row bind processing in the writer
+render_datetime = StockData.__table__.c.date.type.dialect_impl(engine.dialect).bind_processor(engine.dialect) or (lambda value: value)
+
+def insert_rows(db, model, columns, rows):
+    """Insert prepared row tuples with a single DB-API executemany"""
+    if not rows:
+        return
+    placeholders = ", ".join("?" for _ in columns)
+    db.connection().exec_driver_sql(
+        f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) VALUES ({placeholders})",
+        rows
+    )
+
+def bar_rows(series):
+    return [
+        (series.symbol, render_datetime(date), open_price, high_price, low_price, close_price, volume)
+        for date, open_price, high_price, low_price, close_price, volume
+        in zip(series.dates(), series.open, series.high, series.low, series.close, series.volume)
+    ]
+
+def record_rows(records, columns):
+    return [
+        tuple(render_datetime(value) if isinstance(value, datetime) else value for value in (record[column] for column in columns))
+        for record in records
+    ]
+
+def fetch_symbol_data(symbol, days=1825, use_live_data=True):
+    """Fetch bars for one symbol, falling back to mock data"""
+    data = fetch_live_stock_data(symbol, days) if use_live_data else None
+    source = "live"
+
+    if not data:
+        data = generate_mock_stock_data(symbol, days)
+        source = "mock"
+
+    return symbol, source, data
+
+def prepare_symbol_data(symbol, days, use_live_data, cut):
+    """Fetch a symbol and precompute everything the writer stores; runs in a worker process.
+
+    Rollup rows are only produced for periods starting after the one that
+    contains cut, since the boundary period also holds bars older than the
+    window that the worker never sees. The summary is only computed when the
+    window covers its whole lookback.
+    """
+    symbol, source, data = fetch_symbol_data(symbol, days, use_live_data)
+    # Sources can return more history than asked for; the writer only replaces bars from cut
+    data = data.since(cut)
+
+    rollups = {}
+    for resolution in ROLLUP_MODELS:
+        boundary = PERIOD_START[resolution](cut)
+        rows = [row for row in aggregate_bars(data, resolution) if row["date"] > boundary]
+        rollups[resolution] = record_rows(rows, BAR_COLUMNS)
+
+    summary = None
+    if data and (data.end - cut).days >= SUMMARY_WINDOW_DAYS:
+        summary = compute_summary(data, data.end)
+        summary["company_symbol"] = symbol
+        summary = record_rows([summary], SUMMARY_COLUMNS)[0]
+
+    return {
+        "symbol": symbol,
+        "source": source,
+        "bars": bar_rows(data),
+        "rollups": rollups,
+        "summary": summary
+    }
+
+def load_checkpoint(checkpoint_path, days):
+    """Get the symbols a previous run of the same backfill already committed"""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return set()
+
+    with open(checkpoint_path) as checkpoint:
+        lines = checkpoint.read().splitlines()
+
+    # The first line records the window; a checkpoint for another window is stale
+    if not lines or lines[0] != f"days={days}":
+        return set()
+
+    return set(line for line in lines[1:] if line)
+
+def start_checkpoint(checkpoint_path, days, completed):
+    """Rewrite the checkpoint with the window header and already completed symbols"""
+    with open(checkpoint_path, "w") as checkpoint:
+        checkpoint.write(f"days={days}\n")
+        for symbol in sorted(completed):
+            checkpoint.write(f"{symbol}\n")
+
+def record_checkpoint(checkpoint_path, symbol):
+    """Append a committed symbol to the checkpoint"""
+    with open(checkpoint_path, "a") as checkpoint:
+        checkpoint.write(f"{symbol}\n")
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+
+def rebuild_boundary_rollups(db, symbols, cut):
+    """Recompute the rollup period containing cut for each symbol from the stored daily bars"""
+    for resolution, model in ROLLUP_MODELS.items():
+        boundary = PERIOD_START[resolution](cut)
+        boundary_end = next_period_start(resolution, cut)
+
+        rows = db.query(
+            StockData.company_symbol,
+            StockData.date,
+            StockData.open_price,
+            StockData.high_price,
+            StockData.low_price,
+            StockData.close_price,
+            StockData.volume
+        ).filter(
+            StockData.company_symbol.in_(symbols),
+            StockData.date >= boundary,
+            StockData.date < boundary_end
+        ).order_by(StockData.company_symbol, StockData.date).all()
+
+        by_symbol = {}
+        for symbol, *bar in rows:
+            by_symbol.setdefault(symbol, []).append(bar)
+
+        buckets = []
+        for symbol, bars in by_symbol.items():
+            buckets.extend(aggregate_bars(OHLCVSeries.from_rows(symbol, bars), resolution))
+        insert_rows(db, model, BAR_COLUMNS, record_rows(buckets, BAR_COLUMNS))
+
+def write_batch(db, results, cut):
+    """Replace the stored windows for a batch of symbols in one transaction.
+
+    Everything except the rollup period containing cut was precomputed by the
+    workers as ready-to-bind rows, so this only deletes and bulk-inserts.
+    """
+    symbols = [result["symbol"] for result in results]
+    try:
+        db.query(StockData).filter(
+            StockData.company_symbol.in_(symbols),
+            StockData.date >= cut
+        ).delete(synchronize_session=False)
+        for resolution, model in ROLLUP_MODELS.items():
+            db.query(model).filter(
+                model.company_symbol.in_(symbols),
+                model.date >= PERIOD_START[resolution](cut)
+            ).delete(synchronize_session=False)
+        db.query(StockSummary).filter(
+            StockSummary.company_symbol.in_(symbols)
+        ).delete(synchronize_session=False)
+
+        insert_rows(db, StockData, BAR_COLUMNS, [bar for result in results for bar in result["bars"]])
+        rebuild_boundary_rollups(db, symbols, cut)
+        for resolution, model in ROLLUP_MODELS.items():
+            insert_rows(db, model, BAR_COLUMNS, [row for result in results for row in result["rollups"][resolution]])
+
+        insert_rows(db, StockSummary, SUMMARY_COLUMNS, [result["summary"] for result in results if result["summary"]])
+        # Short windows need older stored bars for the summary
+        for result in results:
+            if result["summary"] is None:
+                update_summary(db, result["symbol"])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def backfill(symbols, days=1825, workers=None, use_live_data=True, checkpoint_path=DEFAULT_CHECKPOINT_PATH):
+    """Backfill stock data for many symbols.
+
+    Symbols are sharded across a process pool that fetches the bars and
+    precomputes their rollup and summary rows; results are funnelled back to
+    this process, the only writer, which bulk-inserts them WRITE_BATCH_SIZE
+    symbols per transaction. Every committed symbol is appended to the
+    checkpoint so a crashed run resumes where it stopped. The checkpoint is
+    removed once every symbol has succeeded.
+    """
+    started = time.perf_counter()
+    initialize_database()
+    completed = load_checkpoint(checkpoint_path, days)
+    pending = [symbol for symbol in dict.fromkeys(symbols) if symbol not in completed]
+    skipped = len(completed.intersection(symbols))
+
+    if checkpoint_path:
+        start_checkpoint(checkpoint_path, days, completed)
+
+    # Shared by every symbol so the writer can delete each batch's windows at once
+    cut = window_start(get_start_date(days))
+
+    workers = workers or os.cpu_count() or 1
+    failed = {}
+    sources = {"live": 0, "mock": 0}
+    stats = {"bars": 0, "writer_seconds": 0.0}
+
+    db = next(get_db())
+
+    def flush(batch):
+        if not batch:
+            return
+        writer_started = time.perf_counter()
+        try:
+            write_batch(db, batch, cut)
+            written = batch
+        except Exception:
+            # Retry one by one so a bad symbol doesn't fail the whole batch
+            written = []
+            for result in batch:
+                try:
+                    write_batch(db, [result], cut)
+                    written.append(result)
+                except Exception as e:
+                    failed[result["symbol"]] = str(e)
+
+        for result in written:
+            sources[result["source"]] += 1
+            stats["bars"] += len(result["bars"])
+            if checkpoint_path:
+                record_checkpoint(checkpoint_path, result["symbol"])
+        batch.clear()
+        stats["writer_seconds"] += time.perf_counter() - writer_started
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+            queue = iter(pending)
+            in_flight = {}
+            batch = []
+
+            def submit_next():
+                symbol = next(queue, None)
+                if symbol is not None:
+                    future = executor.submit(prepare_symbol_data, symbol, days, use_live_data, cut)
+                    in_flight[future] = symbol
+
+            # Bound the results held in memory while the writer catches up
+            for _ in range(max(workers * MAX_PENDING_PER_WORKER, WRITE_BATCH_SIZE)):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    symbol = in_flight.pop(future)
+                    submit_next()
+                    try:
+                        batch.append(future.result())
+                    except Exception as e:
+                        failed[symbol] = str(e)
+
+                if len(batch) >= WRITE_BATCH_SIZE or not in_flight:
+                    flush(batch)
+    finally:
+        db.close()
+
+    if checkpoint_path and not failed and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return {
+        "symbols": len(pending) - len(failed),
+        "skipped": skipped,
+        "failed": failed,
+        "sources": sources,
+        "bars": stats["bars"],
+        "workers": workers,
+        "writer_seconds": round(stats["writer_seconds"], 3),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,268 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+from database import StockData
+
+STRATEGIES = ("hold", "sma_crossover")
+REBALANCE_FREQUENCIES = ("daily", "weekly", "monthly", "never")
+
+# Upper bound on parameter combinations simulated in one request
+MAX_COMBINATIONS = 1000
+
+# Combinations are simulated in chunks whose (P, T, N) working arrays hold at
+# most this many cells; simulate keeps several of them alive at 8 bytes each
+MAX_SIMULATION_CELLS = 2_000_000
+
+def load_close_matrix(db, symbols, start_date, end_date):
+    """Load stored daily closes as a (dates x symbols) matrix aligned on calendar day.
+
+    Days where a symbol has no bar carry its previous close forward; days
+    before every symbol has a close are dropped.
+    """
+    rows = db.query(StockData.company_symbol, StockData.date, StockData.close_price).filter(
+        StockData.company_symbol.in_(symbols),
+        StockData.date >= start_date,
+        StockData.date <= end_date
+    ).order_by(StockData.date).all()
+
+    columns = {symbol: index for index, symbol in enumerate(symbols)}
+    closes_by_day = {}
+    for symbol, date, close in rows:
+        # Later bars on the same day win
+        closes_by_day.setdefault(date.date(), {})[columns[symbol]] = close
+
+    missing = set(symbols) - set(symbol for symbol, _, _ in rows)
+    if missing:
+        raise ValueError(f"No stored data for {', '.join(sorted(missing))} in the requested range")
+
+    days = sorted(closes_by_day)
+    closes = np.full((len(days), len(symbols)), np.nan)
+    for row, day in enumerate(days):
+        for column, close in closes_by_day[day].items():
+            closes[row, column] = close
+
+    # Forward fill gaps column by column
+    valid = ~np.isnan(closes)
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(days))[:, None], 0), axis=0)
+    closes = np.take_along_axis(closes, last_valid, axis=0)
+
+    first_complete = int(np.argmax(~np.isnan(closes).any(axis=1)))
+    return days[first_complete:], closes[first_complete:]
+
+def rebalance_mask(days, frequency):
+    """Flag the bars on which the portfolio is rebalanced; the first bar always is"""
+    if frequency == "daily":
+        mask = np.ones(len(days), dtype=bool)
+    elif frequency == "never":
+        mask = np.zeros(len(days), dtype=bool)
+    else:
+        if frequency == "weekly":
+            periods = [day.isocalendar()[:2] for day in days]
+        else:
+            periods = [(day.year, day.month) for day in days]
+        mask = np.array([index == 0 or periods[index] != periods[index - 1] for index in range(len(days))])
+    mask[0] = True
+    return mask
+
+def moving_average(closes, window):
+    """Simple moving average over each column; NaN until the window is full"""
+    cumulative = np.vstack([np.zeros((1, closes.shape[1])), np.cumsum(closes, axis=0)])
+    averages = np.full(closes.shape, np.nan)
+    averages[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return averages
+
+def simulate(closes, target_weights, mask, cost_bps=0.0):
+    """Simulate every parameter combination at once.
+
+    closes is (T, N); target_weights is (P, T, N) and only its rows on
+    rebalance bars are used. mask flags the rebalance bars, either shared (T,)
+    or per combination (P, T). Between rebalances positions drift with prices
+    and the unallocated weight is held as cash. Returns the (P, T) equity
+    curves starting at 1 and the (P,) turnover summed over all rebalances.
+    """
+    mask = np.broadcast_to(mask, target_weights.shape[:2])
+    bars = np.arange(mask.shape[1])
+
+    # Most recent rebalance on or before each bar, and strictly before it
+    anchor = np.maximum.accumulate(np.where(mask, bars, 0), axis=1)
+    previous = np.concatenate([anchor[:, :1], anchor[:, :-1]], axis=1)
+
+    def value_since(start):
+        # Value of each bar relative to the rebalance at start, and the drifted positions
+        weights = np.take_along_axis(target_weights, start[:, :, None], axis=1)
+        positions = weights * (closes / closes[start])
+        return positions.sum(axis=2) + 1.0 - weights.sum(axis=2), positions
+
+    segment_value, _ = value_since(anchor)
+    # Value reached just before each bar's rebalance, and the weights it trades away from
+    segment_end, positions = value_since(previous)
+    drifted = positions / segment_end[:, :, None]
+
+    turnover = np.where(mask, np.abs(target_weights - drifted).sum(axis=2), 0.0)
+    turnover[:, 0] = np.abs(target_weights[:, 0, :]).sum(axis=1)
+    net = 1.0 - cost_bps / 10000.0 * turnover
+
+    # Equity just after the most recent rebalance, net of trading costs
+    growth = np.where(mask, segment_end * net, 1.0)
+    growth[:, 0] = net[:, 0]
+    return np.cumprod(growth, axis=1) * segment_value, turnover.sum(axis=1)
+
+def summarize(days, equity):
+    """Summary statistics for each (P, T) equity curve"""
+    returns = equity[:, 1:] / equity[:, :-1] - 1.0
+    years = (days[-1] - days[0]).days / 365.25
+    # Bars are calendar-day aligned, so annualize by the bars actually stored per year
+    bars_per_year = (len(days) - 1) / years if years > 0 else np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = returns.std(axis=1) * math.sqrt(bars_per_year)
+        sharpe = returns.mean(axis=1) * bars_per_year / volatility
+        cagr = equity[:, -1] ** (1.0 / years) - 1.0 if years > 0 else np.full(len(equity), np.nan)
+
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1.0
+    return {
+        "total_return": equity[:, -1] - 1.0,
+        "cagr": cagr,
+        "volatility": volatility,
+        "sharpe": sharpe,
+        "max_drawdown": drawdown.min(axis=1)
+    }, drawdown
+
+def to_json_float(value, digits=6):
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+def build_combinations(symbols, strategy, weight_sets, fast_windows, slow_windows):
+    """Get the parameters of every combination with its (weight index, window pair) key"""
+    if strategy == "hold":
+        params = [{"weights": dict(zip(symbols, weights))} for weights in weight_sets]
+        return params, [(index, None) for index in range(len(weight_sets))]
+
+    windows = [(fast, slow) for fast in fast_windows for slow in slow_windows if fast < slow]
+    if not windows:
+        raise ValueError("At least one fast window must be shorter than a slow window")
+
+    params = [
+        {"weights": dict(zip(symbols, weights)), "fast_window": fast, "slow_window": slow}
+        for weights in weight_sets for fast, slow in windows
+    ]
+    return params, [(index, window) for index in range(len(weight_sets)) for window in windows]
+
+def combination_weights(closes, base_weights, keys):
+    """Build the (P, T, N) target weights for the combinations with the given keys"""
+    weights = base_weights[[index for index, _ in keys]][:, None, :]  # (P, 1, N)
+    if keys[0][1] is None:
+        return np.broadcast_to(weights, (len(keys),) + closes.shape)
+
+    signals = {}
+    for _, (fast, slow) in keys:
+        if (fast, slow) not in signals:
+            # Hold a symbol at its base weight while its fast average was above the slow
+            # one at the previous close: a signal is only traded on the bar after it appears
+            signal = np.zeros(closes.shape, dtype=bool)
+            signal[1:] = (moving_average(closes, fast) > moving_average(closes, slow))[:-1]
+            signals[fast, slow] = signal
+    return weights * np.array([signals[window] for _, window in keys])
+
+def run_backtest(db, symbols, start_date=None, end_date=None, strategy="hold", weights=None,
+                 fast_windows=(20,), slow_windows=(50,), rebalance="monthly", cost_bps=0.0):
+    """Backtest a strategy over the stored daily closes.
+
+    weights is a list of weight vectors aligned with symbols (equal weight by
+    default); every weight vector, and for sma_crossover every fast/slow
+    window pair, is simulated as one combination. Returns summary statistics
+    for all combinations ranked by Sharpe ratio plus the equity curve and
+    drawdown of the best one. Raises ValueError for invalid requests.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        raise ValueError("At least one symbol is required")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Strategy must be one of: {', '.join(STRATEGIES)}")
+    if rebalance not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Rebalance must be one of: {', '.join(REBALANCE_FREQUENCIES)}")
+    if any(window < 1 for window in list(fast_windows) + list(slow_windows)):
+        raise ValueError("Moving average windows must be positive")
+
+    weight_sets = weights or [[1.0 / len(symbols)] * len(symbols)]
+    for weight_set in weight_sets:
+        if len(weight_set) != len(symbols):
+            raise ValueError("Each weight vector must have one weight per symbol")
+        if any(weight < 0 for weight in weight_set) or sum(weight_set) > 1.0 + 1e-9:
+            raise ValueError("Weights must be non-negative and sum to at most 1")
+
+    combinations = len(weight_sets) * (len(fast_windows) * len(slow_windows) if strategy == "sma_crossover" else 1)
+    if combinations > MAX_COMBINATIONS:
+        raise ValueError(f"At most {MAX_COMBINATIONS} parameter combinations can be run per request")
+
+    # Aware bounds keep their wall-clock time, matching how SQLite stores dates
+    start_date, end_date = (date.replace(tzinfo=None) if date else date for date in (start_date, end_date))
+    end_date = end_date or datetime.now()
+    start_date = start_date or end_date - timedelta(days=365)
+    if start_date >= end_date:
+        raise ValueError("start_date must be before end_date")
+
+    days, closes = load_close_matrix(db, symbols, start_date, end_date)
+    if len(days) < 2:
+        raise ValueError("Not enough overlapping data to backtest")
+
+    chunk_size = MAX_SIMULATION_CELLS // closes.size
+    if chunk_size < 1:
+        raise ValueError("Too many symbols over this date range; shorten the range or backtest fewer symbols")
+
+    params, keys = build_combinations(symbols, strategy, weight_sets, fast_windows, slow_windows)
+    base_weights = np.array(weight_sets, dtype=float)  # (W, N)
+    schedule = rebalance_mask(days, rebalance)
+
+    # Simulate a chunk of combinations at a time to bound memory, keeping the
+    # statistics of all of them and the curves of the best so far
+    chunk_stats, chunk_turnover, best = [], [], None
+    for chunk_start in range(0, len(keys), chunk_size):
+        target_weights = combination_weights(closes, base_weights, keys[chunk_start:chunk_start + chunk_size])
+        mask = schedule
+        if strategy == "sma_crossover":
+            # Trade as soon as a combination's signal flips, not only on the schedule
+            signal_changed = np.zeros(target_weights.shape[:2], dtype=bool)
+            signal_changed[:, 1:] = (target_weights[:, 1:] != target_weights[:, :-1]).any(axis=2)
+            mask = mask | signal_changed
+        equity, turnover = simulate(closes, target_weights, mask, cost_bps)
+        stats, drawdown = summarize(days, equity)
+        chunk_stats.append(stats)
+        chunk_turnover.append(turnover)
+
+        sharpe = np.where(np.isfinite(stats["sharpe"]), stats["sharpe"], -np.inf)
+        index = int(np.argmax(sharpe))
+        # Ties keep the earlier combination
+        if best is None or sharpe[index] > best["sharpe"]:
+            best = {"index": chunk_start + index, "sharpe": sharpe[index], "equity": equity[index], "drawdown": drawdown[index]}
+
+    stats = {name: np.concatenate([chunk[name] for chunk in chunk_stats]) for name in chunk_stats[0]}
+    turnover = np.concatenate(chunk_turnover)
+
+    results = []
+    for index, combination in enumerate(params):
+        result = {"params": combination, "turnover": to_json_float(turnover[index])}
+        for name, values in stats.items():
+            result[name] = to_json_float(values[index])
+        results.append(result)
+
+    sharpe = np.where(np.isfinite(stats["sharpe"]), stats["sharpe"], -np.inf)
+    order = np.argsort(-sharpe, kind="stable")
+
+    return {
+        "symbols": symbols,
+        "start_date": days[0],
+        "end_date": days[-1],
+        "bars": len(days),
+        "strategy": strategy,
+        "rebalance": rebalance,
+        "combinations": len(params),
+        "results": [results[index] for index in order],
+        "best": {
+            "params": params[best["index"]],
+            "equity_curve": [
+                {"date": day, "equity": to_json_float(value), "drawdown": to_json_float(dd)}
+                for day, value, dd in zip(days, best["equity"], best["drawdown"])
+            ]
+        }
+    }
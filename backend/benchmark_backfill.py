@@ -0,0 +1,71 @@
+"""Benchmark the backfill engine against the local mock data source.
+
+Measures the sharded fetch/transform stage on its own and the full backfill
+(including the single writer) for 1, 2, 4, ... worker processes up to the
+core count, writing into a scratch database.
+
+Usage: python benchmark_backfill.py [symbols] [days]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Point the engine at a scratch database before anything imports it; spawned
+# workers re-import this module and inherit the variable instead
+if __name__ == "__main__":
+    scratch_dir = tempfile.mkdtemp(prefix="backfill_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+from concurrent.futures import ProcessPoolExecutor
+from backfill import WORKER_CONTEXT, backfill, prepare_symbol_data
+from stock_service import get_start_date
+
+def worker_counts():
+    cores = os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    counts.append(cores)
+    return counts
+
+def time_fetch_stage(symbols, days, workers):
+    cut = get_start_date(days)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as executor:
+        chunksize = max(len(symbols) // (workers * 4), 1)
+        count = len(symbols)
+        for _ in executor.map(prepare_symbol_data, symbols, [days] * count, [False] * count, [cut] * count, chunksize=chunksize):
+            pass
+    return time.perf_counter() - started
+
+def main():
+    symbol_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 1825
+    symbols = [f"SYM{i:05d}" for i in range(symbol_count)]
+
+    print(f"Backfilling {symbol_count} mock symbols x {days} days on {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'fetch s':>9} {'speedup':>8} {'total s':>9} {'speedup':>8} {'writer s':>9} {'bars/s':>10}")
+
+    fetch_baseline = None
+    baseline = None
+    for workers in worker_counts():
+        fetch_seconds = time_fetch_stage(symbols, days, workers)
+        result = backfill(symbols, days=days, workers=workers, use_live_data=False, checkpoint_path=None)
+        total_seconds = result["seconds"]
+
+        fetch_baseline = fetch_baseline or fetch_seconds
+        baseline = baseline or result
+        total_baseline = baseline["seconds"]
+        print(f"{workers:>8} {fetch_seconds:>9.2f} {fetch_baseline / fetch_seconds:>7.2f}x "
+              f"{total_seconds:>9.2f} {total_baseline / total_seconds:>7.2f}x "
+              f"{result['writer_seconds']:>9.2f} {result['bars'] / total_seconds:>10.0f}")
+
+    # The single writer is the serial part; it bounds the end-to-end speedup
+    print(f"Writer share of the 1-worker run: {baseline['writer_seconds'] / total_baseline:.0%}; "
+          f"speedup bound {total_baseline / baseline['writer_seconds']:.1f}x")
+
+if __name__ == "__main__":
+    main()
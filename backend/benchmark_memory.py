@@ -0,0 +1,61 @@
+"""Benchmark memory per bar: OHLCVSeries versus the previous list of dicts.
+
+Builds the same multi-year, multi-symbol bars both ways and measures the
+allocations with tracemalloc.
+
+Usage: python benchmark_memory.py [symbols] [days]
+"""
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+import random
+
+from series import OHLCVSeries
+
+def generate_rows(symbol, days):
+    end_date = datetime.now()
+    price = 100.0
+    for i in range(days):
+        price *= 1 + random.gauss(0, 0.01)
+        yield (end_date - timedelta(days=days - i), round(price * 0.99, 2), round(price * 1.01, 2),
+               round(price * 0.98, 2), round(price, 2), random.randint(500000, 2000000))
+
+def build_dict_lists(symbols, days):
+    """The representation previously returned by the fetch/generate/read paths"""
+    return [
+        [{"company_symbol": symbol, "date": date, "open_price": open_price, "high_price": high_price,
+          "low_price": low_price, "close_price": close_price, "volume": volume}
+         for date, open_price, high_price, low_price, close_price, volume in generate_rows(symbol, days)]
+        for symbol in symbols
+    ]
+
+def build_series(symbols, days):
+    return [OHLCVSeries.from_rows(symbol, generate_rows(symbol, days)) for symbol in symbols]
+
+def measure(build, symbols, days):
+    random.seed(0)
+    tracemalloc.start()
+    result = build(symbols, days)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak
+
+def main():
+    symbol_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 1825
+    symbols = [f"SYM{i:05d}" for i in range(symbol_count)]
+    bars = symbol_count * days
+
+    print(f"{symbol_count} symbols x {days} daily bars = {bars} bars")
+    print(f"{'representation':>16} {'retained MB':>12} {'peak MB':>9} {'bytes/bar':>10}")
+    results = {}
+    for label, build in (("list of dicts", build_dict_lists), ("OHLCVSeries", build_series)):
+        current, peak = measure(build, symbols, days)
+        results[label] = current
+        print(f"{label:>16} {current / 1e6:>12.1f} {peak / 1e6:>9.1f} {current / bars:>10.1f}")
+
+    print(f"OHLCVSeries uses {results['list of dicts'] / results['OHLCVSeries']:.1f}x less memory per bar")
+
+if __name__ == "__main__":
+    main()
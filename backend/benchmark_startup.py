@@ -0,0 +1,83 @@
+"""Benchmark API import time and database initialization.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+reports the total and the slowest top-level imports, then times startup
+initialization against a new database (cold) and an already initialized
+one (warm). Fails if yfinance or pandas are imported eagerly.
+
+Usage: python benchmark_startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STARTUP_SNIPPET = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.initialize_database()
+initialized = time.perf_counter()
+import sys
+print(imported - started, initialized - imported, "yfinance" in sys.modules, "pandas" in sys.modules)
+"""
+
+def run_python(args, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    return subprocess.run([sys.executable] + args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+
+def parse_importtime(stderr):
+    """Get (cumulative microseconds, module, depth) for every import"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        # Each nesting level is indented by two more spaces
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        imports.append((int(cumulative_us), module.strip(), depth))
+    return imports
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    scratch_dir = tempfile.mkdtemp(prefix="startup_bench_")
+
+    database_url = f"sqlite:///{os.path.join(scratch_dir, 'importtime.db')}"
+    imports = parse_importtime(run_python(["-X", "importtime", "-c", "import main"], database_url).stderr)
+    # Children are reported before their parent, so collect the direct
+    # imports seen since the previous top-level module until main shows up
+    direct = []
+    for cumulative, module, depth in imports:
+        if depth == 1:
+            direct.append((cumulative, module))
+        elif depth == 0:
+            if module == "main":
+                main_us = cumulative
+                break
+            direct = []
+    print(f"import main: {main_us / 1000:.1f} ms")
+    for cumulative, module in sorted(direct, reverse=True)[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+    cold = []
+    warm = []
+    for run in range(runs):
+        database_url = f"sqlite:///{os.path.join(scratch_dir, f'startup_{run}.db')}"
+        for timings in (cold, warm):
+            # Seeding prints progress, so the timings are on the last line
+            output = run_python(["-c", STARTUP_SNIPPET], database_url).stdout.splitlines()[-1].split()
+            import_seconds, init_seconds = float(output[0]), float(output[1])
+            if output[2] == "True" or output[3] == "True":
+                sys.exit("yfinance/pandas imported at startup")
+            timings.append((import_seconds, init_seconds))
+
+    for label, timings in (("cold", cold), ("warm", warm)):
+        import_ms = min(seconds for seconds, _ in timings) * 1000
+        init_ms = min(seconds for _, seconds in timings) * 1000
+        print(f"{label} start: import {import_ms:.1f} ms + initialize {init_ms:.1f} ms (best of {runs})")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import os
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./stock_dashboard.db"
+# Overridable so scripts and benchmarks can point at a scratch database
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./stock_dashboard.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
@@ -23,7 +25,7 @@ class Company(Base):
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, unique=True, index=True)
     name = Column(String)
-    sector = Column(String)
+    sector = Column(String, index=True)
     description = Column(Text, nullable=True)
 
 class StockData(Base):
@@ -38,7 +40,122 @@ class StockData(Base):
     close_price = Column(Float)
     volume = Column(Integer)
 
-Base.metadata.create_all(bind=engine)
+class StockDataWeekly(Base):
+    __tablename__ = "stock_data_weekly"
+    __table_args__ = (Index("ix_stock_data_weekly_symbol_date", "company_symbol", "date", unique=True),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_symbol = Column(String, index=True)
+    date = Column(DateTime)  # Monday of the week
+    open_price = Column(Float)
+    high_price = Column(Float)
+    low_price = Column(Float)
+    close_price = Column(Float)
+    volume = Column(Integer)
+
+class StockDataMonthly(Base):
+    __tablename__ = "stock_data_monthly"
+    __table_args__ = (Index("ix_stock_data_monthly_symbol_date", "company_symbol", "date", unique=True),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_symbol = Column(String, index=True)
+    date = Column(DateTime)  # First day of the month
+    open_price = Column(Float)
+    high_price = Column(Float)
+    low_price = Column(Float)
+    close_price = Column(Float)
+    volume = Column(Integer)
+
+# Per-symbol screener statistics, maintained whenever daily bars change
+class StockSummary(Base):
+    __tablename__ = "stock_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_symbol = Column(String, unique=True, index=True)
+    latest_date = Column(DateTime)
+    latest_close = Column(Float, index=True)
+    return_1d = Column(Float, index=True)  # Percent change
+    return_1w = Column(Float, index=True)
+    return_1m = Column(Float, index=True)
+    return_1y = Column(Float, index=True)
+    high_52w = Column(Float)
+    low_52w = Column(Float)
+    avg_volume = Column(Float, index=True)  # Mean over the last 30 days
+    volatility = Column(Float, index=True)  # Std dev of daily percent returns over the last year
+
+# Database maintenance scheduler state, a single row shared by every API worker process
+class MaintenanceState(Base):
+    __tablename__ = "maintenance_state"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    lock_owner = Column(String, nullable=True)  # Token of the process currently running maintenance
+    locked_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_report = Column(Text, nullable=True)  # JSON report of the last run
+    last_activity = Column(DateTime, nullable=True)  # Latest API request seen by any worker
+
+# Bump whenever tables or indexes are added so existing databases are upgraded
+SCHEMA_VERSION = 3
+
+# How long a starting worker waits for another one to finish upgrading the schema
+INIT_LOCK_TIMEOUT_SECONDS = 600
+
+_initialized = False
+
+def _schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def init_db(seed=None):
+    """Create the schema and run seed(db) once per database.
+    
+    Initialized SQLite databases are recognised from PRAGMA user_version with a
+    single query, so workers starting against an existing file skip the
+    metadata reflection done by create_all. The upgrade itself runs in one
+    BEGIN IMMEDIATE transaction and re-reads the version once the write lock
+    is held, so when several workers start together only the first one
+    creates the schema and seeds; the rest wait and then skip it.
+    """
+    global _initialized
+    if _initialized:
+        return
+    
+    is_sqlite = engine.dialect.name == "sqlite"
+    if is_sqlite:
+        with engine.connect() as connection:
+            if _schema_version(connection) >= SCHEMA_VERSION:
+                _initialized = True
+                return
+    
+    with engine.connect() as connection:
+        if is_sqlite:
+            busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            connection.exec_driver_sql(f"PRAGMA busy_timeout = {INIT_LOCK_TIMEOUT_SECONDS * 1000}")
+        try:
+            if is_sqlite:
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            
+            if not is_sqlite or _schema_version(connection) < SCHEMA_VERSION:
+                Base.metadata.create_all(bind=connection)
+                # create_all only builds indexes along with new tables, so add any
+                # indexes introduced on tables that already existed
+                for table in Base.metadata.sorted_tables:
+                    for index in table.indexes:
+                        index.create(bind=connection, checkfirst=True)
+                if seed is not None:
+                    # Joins this transaction; its commits don't release the lock
+                    db = SessionLocal(bind=connection)
+                    try:
+                        seed(db)
+                    finally:
+                        db.close()
+                if is_sqlite:
+                    connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            
+            connection.commit()
+        finally:
+            if is_sqlite:
+                connection.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+    _initialized = True
 
 def get_db():
     db = SessionLocal()
@@ -1,13 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from database import get_db, engine, Base, Company, StockData
-from models import Company as CompanyModel, StockData as StockDataModel
-from stock_service import populate_companies, populate_all_stock_data, get_stock_data, test_data_generation, force_populate_stock_data
-import uvicorn
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from database import get_db, Company, StockData
+from models import Company as CompanyModel, StockData as StockDataModel, BacktestRequest
+from stock_service import initialize_database, populate_all_stock_data, get_stock_data, test_data_generation, force_populate_stock_data, clear_stock_data, get_start_date, get_resolution, get_expected_data_points, query_stock_data
+from screener import screen_stocks, SCREENER_FIELDS
+from typing import Optional
+import asyncio
+import maintenance
 
 app = FastAPI(title="Stock Market Dashboard API", version="1.0.0")
 
@@ -20,13 +20,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_activity(request: Request, call_next):
+    """Record API activity so scheduled maintenance waits for an idle period"""
+    maintenance.record_activity()
+    return await call_next(request)
+
+async def maintenance_loop():
+    """Run database maintenance in a worker thread whenever it is due and the API is idle.
+    
+    Every API worker runs this loop; the database lock lets only one of them
+    run maintenance per interval.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(maintenance.MAINTENANCE_CHECK_SECONDS)
+        try:
+            if not await loop.run_in_executor(None, maintenance.maintenance_due):
+                continue
+            report = await loop.run_in_executor(None, maintenance.run_maintenance, maintenance.MAINTENANCE_STEPS, True)
+            if report is not None:
+                print(f"Scheduled maintenance finished in {report['seconds']}s")
+        except Exception as e:
+            print(f"Scheduled maintenance failed: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database with sample data on startup"""
     try:
         print("Initializing database...")
-        populate_companies()
-        print("Companies populated successfully")
+        # Creates tables and seeds companies only if this database hasn't been initialized
+        initialize_database()
+        print("Database initialized successfully")
+        
+        asyncio.create_task(maintenance_loop())
         
         # Skip data population on startup to avoid hanging
         print("Skipping data population on startup to avoid connection issues...")
@@ -54,19 +81,25 @@ async def get_company(symbol: str, db: Session = Depends(get_db)):
     return CompanyModel.from_orm(company)
 
 @app.get("/api/stocks/{symbol}")
-async def get_stock_data_endpoint(symbol: str, days: int = 30, db: Session = Depends(get_db)):
-    """Get stock data for a specific company with time range"""
+async def get_stock_data_endpoint(symbol: str, days: int = 30, resolution: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get stock data for a specific company with time range.
+    
+    Resolution defaults to daily bars up to a year and weekly bars beyond.
+    """
     # Validate days parameter
     if days < 1 or days > 1825:  # Max 5 years
         raise HTTPException(status_code=400, detail="Days must be between 1 and 1825")
     
+    if resolution is not None and resolution not in ("daily", "weekly", "monthly"):
+        raise HTTPException(status_code=400, detail="Resolution must be daily, weekly or monthly")
+    
     # Check if company exists
     company = db.query(Company).filter(Company.symbol == symbol).first()
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
     
     # Get stock data
-    stock_data = get_stock_data(symbol, days)
+    stock_data = get_stock_data(symbol, days, resolution)
     return stock_data
 
 @app.get("/api/stocks/{symbol}/latest")
@@ -107,18 +140,8 @@ async def refresh_stock_data(symbol: str, days: int = 30, db: Session = Depends(
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
     
-    # Clear existing data for this symbol and time range
-    from datetime import datetime, timedelta
-    end_date = datetime.now()
-    if days > 365:
-        start_date = end_date - timedelta(weeks=min(days // 7, 260))
-    else:
-        start_date = end_date - timedelta(days=days)
-    
-    db.query(StockData).filter(
-        StockData.company_symbol == symbol,
-        StockData.date >= start_date
-    ).delete()
+    # Clear existing data (and the rollups built from it) for this symbol and time range
+    clear_stock_data(db, symbol, get_start_date(days))
     db.commit()
     
     # Get fresh data
@@ -126,14 +149,100 @@ async def refresh_stock_data(symbol: str, days: int = 30, db: Session = Depends(
     return {"message": f"Data refreshed for {symbol}", "data": stock_data}
 
 @app.post("/api/populate-all-data")
-async def populate_all_data():
+async def populate_all_data(workers: Optional[int] = None):
     """Populate stock data for all companies and all time periods"""
+    if workers is not None and workers < 1:
+        raise HTTPException(status_code=400, detail="Workers must be at least 1")
+    
     try:
-        populate_all_stock_data()
-        return {"message": "Successfully populated stock data for all companies and time periods"}
+        result = populate_all_stock_data(workers)
+        return {"message": "Successfully populated stock data for all companies and time periods", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error populating data: {str(e)}")
 
+@app.get("/api/screener")
+async def get_screener(request: Request, sector: Optional[str] = None, sort_by: str = "return_1d", order: str = "desc", limit: int = 50, db: Session = Depends(get_db)):
+    """Screen companies on their precomputed summary statistics.
+    
+    Any summary field can be bounded with min_<field> / max_<field> query
+    parameters, e.g. /api/screener?min_return_1w=5 or
+    /api/screener?sector=Technology&sort_by=avg_volume.
+    """
+    if sort_by not in SCREENER_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(SCREENER_FIELDS)}")
+    
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Order must be asc or desc")
+    
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 500")
+    
+    filters = {}
+    for key, value in request.query_params.items():
+        if not key.startswith(("min_", "max_")):
+            continue
+        if key[4:] not in SCREENER_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown screener filter: {key}")
+        try:
+            filters[key] = float(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Filter {key} must be a number")
+    
+    results = screen_stocks(db, sector, filters, sort_by, order == "desc", limit)
+    return {"count": len(results), "results": results}
+
+@app.post("/api/backtest")
+def backtest(request: BacktestRequest, db: Session = Depends(get_db)):
+    """Backtest fixed weights or an SMA crossover over stored daily closes.
+    
+    Every weight vector and fast/slow window pair is simulated in one batch;
+    results are ranked by Sharpe ratio with the best equity curve included.
+    A plain def so FastAPI runs the CPU-bound simulation in its threadpool
+    instead of blocking the event loop.
+    """
+    # Imported on first use to keep NumPy out of API startup
+    from backtest import run_backtest
+    
+    try:
+        return run_backtest(
+            db,
+            request.symbols,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            strategy=request.strategy,
+            weights=request.weights,
+            fast_windows=request.fast_windows,
+            slow_windows=request.slow_windows,
+            rebalance=request.rebalance,
+            cost_bps=request.cost_bps
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/admin/maintenance")
+async def get_maintenance_status():
+    """Get database file size and fragmentation plus the last maintenance report from any worker"""
+    return {"database": maintenance.database_stats(), **maintenance.maintenance_status()}
+
+@app.post("/api/admin/maintenance")
+async def run_maintenance_endpoint(steps: Optional[str] = None):
+    """Run database maintenance now.
+    
+    steps is a comma separated subset of deduplicate, retention, vacuum and
+    analyze; all of them run by default.
+    """
+    selected = maintenance.MAINTENANCE_STEPS
+    if steps is not None:
+        selected = [step.strip() for step in steps.split(",") if step.strip()]
+        unknown = [step for step in selected if step not in maintenance.MAINTENANCE_STEPS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Steps must be among: {', '.join(maintenance.MAINTENANCE_STEPS)}")
+    
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, maintenance.run_maintenance, selected)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.get("/api/time-periods")
 async def get_time_periods():
     """Get available time periods for stock data"""
@@ -174,21 +283,12 @@ async def get_data_status(db: Session = Depends(get_db)):
         }
         
         for days in time_periods:
-            # Calculate expected data points
-            expected_points = days if days <= 365 else min(days // 7, 260)
+            # Calculate expected data points at the resolution served for this period
+            resolution = get_resolution(days)
+            expected_points = get_expected_data_points(days, resolution)
             
             # Count actual data points
-            from datetime import datetime, timedelta
-            end_date = datetime.now()
-            if days > 365:
-                start_date = end_date - timedelta(weeks=min(days // 7, 260))
-            else:
-                start_date = end_date - timedelta(days=days)
-            
-            actual_points = db.query(StockData).filter(
-                StockData.company_symbol == company.symbol,
-                StockData.date >= start_date
-            ).count()
+            actual_points = query_stock_data(db, company.symbol, get_start_date(days), resolution).count()
             
             company_status["data_points"][f"{days}_days"] = {
                 "expected": expected_points,
@@ -243,4 +343,5 @@ async def populate_sample_data():
         raise HTTPException(status_code=500, detail=f"Error populating sample data: {str(e)}")
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
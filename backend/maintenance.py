@@ -0,0 +1,309 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from database import engine, get_db, StockData, StockDataWeekly, StockDataMonthly, StockSummary, MaintenanceState
+from rollups import update_rollups, week_start, month_start
+from screener import update_summary
+
+# Daily bars older than this are dropped; longer ranges are served from the
+# rollups, which are kept. Covers the longest range the API serves plus slack.
+DAILY_RETENTION_DAYS = 1825 + 60
+
+# None keeps weekly rollups indefinitely; monthly rollups are always kept
+WEEKLY_RETENTION_DAYS = None
+
+# Free pages returned to the filesystem per run, to keep the write lock short
+INCREMENTAL_VACUUM_PAGES = 10000
+
+# Scheduler: run at most this often, and only once the API has been idle
+MAINTENANCE_INTERVAL_SECONDS = 6 * 3600
+MAINTENANCE_IDLE_SECONDS = 300
+MAINTENANCE_CHECK_SECONDS = 60
+
+# A lock held longer than this is assumed to belong to a process that died mid-run
+MAINTENANCE_LOCK_TIMEOUT_SECONDS = 2 * 3600
+
+MAINTENANCE_STEPS = ("deduplicate", "retention", "vacuum", "analyze")
+
+# Latest request served by this process; published to maintenance_state by the scheduler
+_last_activity = datetime.now()
+
+def record_activity():
+    """Note that the API is serving a request, postponing idle maintenance"""
+    global _last_activity
+    _last_activity = datetime.now()
+
+def _get_state(db):
+    """Get the maintenance state row shared by all worker processes, creating it on first use"""
+    state = db.query(MaintenanceState).filter(MaintenanceState.id == 1).first()
+    if state is None:
+        try:
+            db.add(MaintenanceState(id=1))
+            db.commit()
+        except IntegrityError:
+            # Another process created it first
+            db.rollback()
+        state = db.query(MaintenanceState).filter(MaintenanceState.id == 1).first()
+    return state
+
+def maintenance_due():
+    """Whether the scheduler should run maintenance now.
+
+    Publishes this process's latest activity first, so with several API
+    workers maintenance waits until all of them have been idle.
+    """
+    now = datetime.now()
+    db = next(get_db())
+    try:
+        state = _get_state(db)
+        # Only ever move the shared activity time forward
+        db.query(MaintenanceState).filter(
+            MaintenanceState.id == 1,
+            or_(MaintenanceState.last_activity.is_(None), MaintenanceState.last_activity < _last_activity)
+        ).update({"last_activity": _last_activity}, synchronize_session=False)
+        db.commit()
+
+        if state.last_run_at is not None and now - state.last_run_at < timedelta(seconds=MAINTENANCE_INTERVAL_SECONDS):
+            return False
+        return now - state.last_activity >= timedelta(seconds=MAINTENANCE_IDLE_SECONDS)
+    finally:
+        db.close()
+
+def maintenance_status():
+    """Get the last maintenance report and whether a run is in progress in any process"""
+    db = next(get_db())
+    try:
+        state = _get_state(db)
+        return {
+            "running": state.lock_owner is not None,
+            "last_run_at": state.last_run_at,
+            "last_run": json.loads(state.last_report) if state.last_report else None
+        }
+    finally:
+        db.close()
+
+def _acquire_lock(token, scheduled):
+    """Take the maintenance lock for token; scheduled runs also require the interval to have passed"""
+    now = datetime.now()
+    db = next(get_db())
+    try:
+        _get_state(db)
+        query = db.query(MaintenanceState).filter(
+            MaintenanceState.id == 1,
+            or_(
+                MaintenanceState.lock_owner.is_(None),
+                MaintenanceState.locked_at < now - timedelta(seconds=MAINTENANCE_LOCK_TIMEOUT_SECONDS)
+            )
+        )
+        if scheduled:
+            # Another worker may have finished a run since this one decided maintenance was due
+            query = query.filter(or_(
+                MaintenanceState.last_run_at.is_(None),
+                MaintenanceState.last_run_at < now - timedelta(seconds=MAINTENANCE_INTERVAL_SECONDS)
+            ))
+        # A single conditional UPDATE, so SQLite serializes competing processes
+        acquired = query.update({"lock_owner": token, "locked_at": now}, synchronize_session=False) == 1
+        db.commit()
+        return acquired
+    finally:
+        db.close()
+
+def _release_lock(token, report):
+    """Release the maintenance lock and store the report of the run"""
+    db = next(get_db())
+    try:
+        values = {"lock_owner": None, "locked_at": None}
+        # An interrupted run keeps the previous report
+        if report is not None:
+            values.update({"last_run_at": datetime.now(), "last_report": json.dumps(report, default=datetime.isoformat)})
+        db.query(MaintenanceState).filter(
+            MaintenanceState.id == 1,
+            MaintenanceState.lock_owner == token
+        ).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _pragma(connection, name):
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+def database_stats():
+    """Get file size, page usage and row counts for the database"""
+    db = next(get_db())
+    try:
+        stats = {
+            "rows": {
+                "stock_data": db.query(StockData).count(),
+                "stock_data_weekly": db.query(StockDataWeekly).count(),
+                "stock_data_monthly": db.query(StockDataMonthly).count(),
+                "stock_summaries": db.query(StockSummary).count()
+            }
+        }
+    finally:
+        db.close()
+
+    if engine.dialect.name != "sqlite":
+        return stats
+
+    with engine.connect() as connection:
+        page_size = _pragma(connection, "page_size")
+        page_count = _pragma(connection, "page_count")
+        freelist_count = _pragma(connection, "freelist_count")
+        auto_vacuum = _pragma(connection, "auto_vacuum")
+
+    stats.update({
+        "file_size_bytes": os.path.getsize(engine.url.database) if engine.url.database and os.path.exists(engine.url.database) else None,
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist_count,
+        # Share of the file made of pages no table or index is using
+        "fragmentation_percent": round(freelist_count / page_count * 100, 2) if page_count else 0.0,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(auto_vacuum, auto_vacuum)
+    })
+    return stats
+
+def deduplicate_bars():
+    """Keep only the most recently stored daily bar per symbol and calendar day"""
+    db = next(get_db())
+    try:
+        day = func.date(StockData.date)
+        duplicates = db.query(StockData.company_symbol, func.min(StockData.date)).group_by(
+            StockData.company_symbol, day
+        ).having(func.count(StockData.id) > 1).all()
+
+        # Earliest duplicated day per symbol, to rebuild rollups from there
+        affected = {}
+        for symbol, date in duplicates:
+            affected[symbol] = min(date, affected.get(symbol, date))
+
+        removed = 0
+        if affected:
+            keep = db.query(func.max(StockData.id)).group_by(StockData.company_symbol, day)
+            removed = db.query(StockData).filter(StockData.id.notin_(keep)).delete(synchronize_session=False)
+            for symbol, since in affected.items():
+                update_rollups(db, symbol, since)
+                update_summary(db, symbol)
+            db.commit()
+
+        return {"removed": removed, "symbols": len(affected)}
+    finally:
+        db.close()
+
+def apply_retention(daily_days=DAILY_RETENTION_DAYS, weekly_days=WEEKLY_RETENTION_DAYS):
+    """Drop daily bars (and optionally weekly rollups) older than the retention windows.
+
+    Rollups are left in place, so long ranges stay available after the daily
+    bars they were built from are gone.
+    """
+    now = datetime.now()
+    # Cut on the Monday starting the month's first week, so the week straddling
+    # the month boundary keeps all of its daily bars
+    daily_cutoff = week_start(month_start(now - timedelta(days=daily_days)))
+
+    db = next(get_db())
+    try:
+        # Symbols with nothing left after the cut must drop their summaries
+        emptied = [symbol for symbol, in db.query(StockData.company_symbol).group_by(
+            StockData.company_symbol
+        ).having(func.max(StockData.date) < daily_cutoff)]
+
+        report = {
+            "daily_cutoff": daily_cutoff,
+            "daily_removed": db.query(StockData).filter(StockData.date < daily_cutoff).delete(synchronize_session=False),
+            "weekly_removed": 0
+        }
+
+        if weekly_days is not None:
+            weekly_cutoff = week_start(now - timedelta(days=weekly_days))
+            report["weekly_cutoff"] = weekly_cutoff
+            report["weekly_removed"] = db.query(StockDataWeekly).filter(
+                StockDataWeekly.date < weekly_cutoff
+            ).delete(synchronize_session=False)
+
+        for symbol in emptied:
+            update_summary(db, symbol)
+
+        db.commit()
+        return report
+    finally:
+        db.close()
+
+def incremental_vacuum(pages=INCREMENTAL_VACUUM_PAGES):
+    """Return up to pages free pages to the filesystem.
+
+    Databases created without auto_vacuum are converted to incremental mode
+    first, which takes one full VACUUM.
+    """
+    if engine.dialect.name != "sqlite":
+        return {"skipped": "not a SQLite database"}
+
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        freelist_before = _pragma(connection, "freelist_count")
+
+        converted = _pragma(connection, "auto_vacuum") != 2
+        if converted:
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+        else:
+            # The pragma frees one page per step, and a plain execute only steps it
+            # once; executescript runs it to completion
+            connection.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+        freelist_after = _pragma(connection, "freelist_count")
+
+    return {"converted": converted, "pages_freed": freelist_before - freelist_after}
+
+def analyze():
+    """Refresh the query planner statistics"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE")
+        connection.commit()
+    return {}
+
+STEP_FUNCTIONS = {
+    "deduplicate": deduplicate_bars,
+    "retention": apply_retention,
+    "vacuum": incremental_vacuum,
+    "analyze": analyze
+}
+
+def run_maintenance(steps=MAINTENANCE_STEPS, scheduled=False):
+    """Run the maintenance steps in order and report what each did and how long it took.
+
+    A failing step is reported and the remaining steps still run. Runs are
+    coordinated across worker processes through the maintenance_state row,
+    which also stores the report. Raises RuntimeError if maintenance is
+    already running; a scheduled run instead returns None, and also skips if
+    another process ran maintenance within the interval.
+    """
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    if not _acquire_lock(token, scheduled):
+        if scheduled:
+            return None
+        raise RuntimeError("Maintenance is already running")
+
+    completed = None
+    try:
+        started = time.perf_counter()
+        report = {"started_at": datetime.now(), "before": database_stats(), "steps": []}
+
+        for step in steps:
+            step_started = time.perf_counter()
+            try:
+                result = {"name": step, "status": "ok", **STEP_FUNCTIONS[step]()}
+            except Exception as e:
+                result = {"name": step, "status": "error", "error": str(e)}
+            result["seconds"] = round(time.perf_counter() - step_started, 4)
+            report["steps"].append(result)
+
+        report["after"] = database_stats()
+        report["seconds"] = round(time.perf_counter() - started, 4)
+        completed = report
+        return report
+    finally:
+        _release_lock(token, completed)
@@ -38,3 +38,14 @@ class CompanyList(BaseModel):
 
 class StockDataList(BaseModel):
     stock_data: List[StockData]
+
+class BacktestRequest(BaseModel):
+    symbols: List[str]
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    strategy: str = "hold"  # "hold" or "sma_crossover"
+    weights: Optional[List[List[float]]] = None  # One or more weight vectors aligned with symbols
+    fast_windows: List[int] = [20]
+    slow_windows: List[int] = [50]
+    rebalance: str = "monthly"  # "daily", "weekly", "monthly" or "never"
+    cost_bps: float = 0.0
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from database import StockData, StockDataWeekly, StockDataMonthly
+from series import OHLCVSeries
+
+# Materialized rollup tables keyed by resolution name
+ROLLUP_MODELS = {
+    "weekly": StockDataWeekly,
+    "monthly": StockDataMonthly
+}
+
+def week_start(date):
+    """Return midnight on the Monday of the week containing date"""
+    day = datetime(date.year, date.month, date.day)
+    return day - timedelta(days=day.weekday())
+
+def month_start(date):
+    """Return midnight on the first day of the month containing date"""
+    return datetime(date.year, date.month, 1)
+
+PERIOD_START = {
+    "weekly": week_start,
+    "monthly": month_start
+}
+
+def next_period_start(resolution, date):
+    """Return the start of the period following the one containing date"""
+    start = PERIOD_START[resolution](date)
+    # A week later, or somewhere inside the next month
+    return PERIOD_START[resolution](start + timedelta(days=7 if resolution == "weekly" else 32))
+
+def aggregate_bars(series, resolution):
+    """Fold a date-ordered daily OHLCVSeries into OHLCV bucket rows for the given resolution"""
+    period_start = PERIOD_START[resolution]
+    buckets = {}
+
+    for index, date in enumerate(series.dates()):
+        key = period_start(date)
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {
+                "company_symbol": series.symbol,
+                "date": key,
+                "open_price": series.open[index],  # First open of the period
+                "high_price": series.high[index],
+                "low_price": series.low[index],
+                "close_price": series.close[index],
+                "volume": series.volume[index]
+            }
+        else:
+            bucket["high_price"] = max(bucket["high_price"], series.high[index])
+            bucket["low_price"] = min(bucket["low_price"], series.low[index])
+            bucket["close_price"] = series.close[index]  # Last close of the period
+            bucket["volume"] += series.volume[index]
+
+    return list(buckets.values())
+
+def update_rollups(db, symbol, since, keep_retained=False):
+    """Rebuild the weekly and monthly buckets touched by daily bars dated on or after since.
+
+    Only the buckets from the one containing since onwards are recomputed, so
+    ingesting the most recent bars costs a handful of rows rather than the
+    whole history. With keep_retained, a stored bucket starting before the
+    symbol's oldest daily bar is left alone, as retention may have dropped
+    part of the bars it was built from. The caller is responsible for
+    committing.
+    """
+    # Daily rows may still be pending in the session (autoflush is disabled)
+    db.flush()
+
+    first_date = None
+    if keep_retained:
+        first_date = db.query(func.min(StockData.date)).filter(StockData.company_symbol == symbol).scalar()
+
+    for resolution, model in ROLLUP_MODELS.items():
+        bucket_start = PERIOD_START[resolution](since)
+        if first_date is not None and bucket_start < first_date and db.query(model.id).filter(
+            model.company_symbol == symbol,
+            model.date == bucket_start
+        ).first() is not None:
+            bucket_start = next_period_start(resolution, bucket_start)
+
+        bars = OHLCVSeries.from_rows(symbol, db.query(
+            StockData.date,
+            StockData.open_price,
+            StockData.high_price,
+            StockData.low_price,
+            StockData.close_price,
+            StockData.volume
+        ).filter(
+            StockData.company_symbol == symbol,
+            StockData.date >= bucket_start
+        ).order_by(StockData.date))
+
+        db.query(model).filter(
+            model.company_symbol == symbol,
+            model.date >= bucket_start
+        ).delete(synchronize_session=False)
+
+        rows = aggregate_bars(bars, resolution)
+        if rows:
+            db.bulk_insert_mappings(model, rows)
@@ -0,0 +1,137 @@
+from bisect import bisect_right
+from datetime import timedelta
+from sqlalchemy import func
+from database import Company, StockData, StockSummary
+from series import OHLCVSeries, to_epoch_ns
+
+# Lookbacks for the summary returns, in calendar days
+RETURN_PERIODS = {
+    "return_1d": 1,
+    "return_1w": 7,
+    "return_1m": 30,
+    "return_1y": 365
+}
+
+AVG_VOLUME_DAYS = 30
+
+NS_PER_DAY = 86400 * 10**9
+
+# Enough history for the 1 year return to find a close on or before its start
+SUMMARY_WINDOW_DAYS = 372
+
+# Summary fields the screener can filter (min_<field>/max_<field>) and sort by
+SCREENER_FIELDS = [
+    "latest_close",
+    "return_1d",
+    "return_1w",
+    "return_1m",
+    "return_1y",
+    "high_52w",
+    "low_52w",
+    "avg_volume",
+    "volatility"
+]
+
+def percent_change(old, new):
+    if old is None or not old:
+        return None
+    return round((new - old) / old * 100, 4)
+
+def compute_summary(series, latest):
+    """Compute screener statistics from the trailing daily bars ending at latest"""
+    latest_ns = to_epoch_ns(latest)
+    latest_close = series.close[-1]
+
+    def close_on_or_before(days):
+        index = bisect_right(series.timestamps, latest_ns - days * NS_PER_DAY)
+        return series.close[index - 1] if index > 0 else None
+
+    summary = {"latest_date": latest, "latest_close": latest_close}
+    for field, days in RETURN_PERIODS.items():
+        summary[field] = percent_change(close_on_or_before(days), latest_close)
+
+    year_start = bisect_right(series.timestamps, latest_ns - 365 * NS_PER_DAY)
+    summary["high_52w"] = max(series.high[year_start:])
+    summary["low_52w"] = min(series.low[year_start:])
+
+    volume_start = bisect_right(series.timestamps, latest_ns - AVG_VOLUME_DAYS * NS_PER_DAY)
+    volumes = series.volume[volume_start:]
+    summary["avg_volume"] = round(sum(volumes) / len(volumes), 2)
+
+    # Same definition as the dashboard: std dev of daily percent returns
+    closes = series.close[year_start:]
+    returns = [(close - previous) / previous * 100 for previous, close in zip(closes, closes[1:]) if previous]
+    if returns:
+        mean_return = sum(returns) / len(returns)
+        summary["volatility"] = round((sum((ret - mean_return) ** 2 for ret in returns) / len(returns)) ** 0.5, 4)
+    else:
+        summary["volatility"] = None
+
+    return summary
+
+def update_summary(db, symbol):
+    """Recompute a symbol's screener summary from its most recent daily bars.
+
+    Reads at most SUMMARY_WINDOW_DAYS of bars, so the cost does not grow with
+    the stored history. The caller is responsible for committing.
+    """
+    # Daily rows may still be pending in the session (autoflush is disabled)
+    db.flush()
+
+    summary = db.query(StockSummary).filter(StockSummary.company_symbol == symbol).first()
+    latest = db.query(func.max(StockData.date)).filter(StockData.company_symbol == symbol).scalar()
+
+    if latest is None:
+        if summary is not None:
+            db.delete(summary)
+        return
+
+    series = OHLCVSeries.from_rows(symbol, db.query(
+        StockData.date,
+        StockData.open_price,
+        StockData.high_price,
+        StockData.low_price,
+        StockData.close_price,
+        StockData.volume
+    ).filter(
+        StockData.company_symbol == symbol,
+        StockData.date >= latest - timedelta(days=SUMMARY_WINDOW_DAYS)
+    ).order_by(StockData.date))
+
+    if summary is None:
+        summary = StockSummary(company_symbol=symbol)
+        db.add(summary)
+    for field, value in compute_summary(series, latest).items():
+        setattr(summary, field, value)
+
+def screen_stocks(db, sector=None, filters=None, sort_by="return_1d", descending=True, limit=50):
+    """Filter and sort the per-symbol summaries in a single query.
+
+    filters maps "min_<field>" / "max_<field>" to bounds on SCREENER_FIELDS.
+    """
+    query = db.query(StockSummary, Company.name, Company.sector).outerjoin(
+        Company, Company.symbol == StockSummary.company_symbol
+    )
+
+    if sector is not None:
+        query = query.filter(Company.sector == sector)
+
+    for key, bound in (filters or {}).items():
+        column = getattr(StockSummary, key[4:])
+        if key.startswith("min_"):
+            query = query.filter(column >= bound)
+        else:
+            query = query.filter(column <= bound)
+
+    column = getattr(StockSummary, sort_by)
+    # Symbols without enough history for the sort field are left out
+    query = query.filter(column.isnot(None)).order_by(column.desc() if descending else column.asc())
+
+    results = []
+    for summary, name, company_sector in query.limit(limit).all():
+        result = {"symbol": summary.company_symbol, "name": name, "sector": company_sector}
+        result["latest_date"] = summary.latest_date
+        for field in SCREENER_FIELDS:
+            result[field] = getattr(summary, field)
+        results.append(result)
+    return results
@@ -0,0 +1,115 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch_ns(date):
+    """Convert a datetime to nanoseconds since the epoch.
+
+    Aware datetimes keep their wall-clock time, matching how SQLite stores them.
+    """
+    if date.tzinfo is not None:
+        date = date.replace(tzinfo=None)
+    return (date - EPOCH) // timedelta(microseconds=1) * 1000
+
+def from_epoch_ns(timestamp):
+    """Convert nanoseconds since the epoch back to a naive datetime"""
+    return EPOCH + timedelta(microseconds=timestamp // 1000)
+
+class OHLCVSeries:
+    """Bars for one symbol stored column-wise in contiguous arrays.
+
+    Timestamps are int64 epoch nanoseconds, prices are doubles and volumes are
+    int64, so a bar costs 48 bytes instead of a dict with seven boxed values.
+    """
+    __slots__ = ("symbol", "timestamps", "open", "high", "low", "close", "volume")
+
+    def __init__(self, symbol, timestamps=None, open=None, high=None, low=None, close=None, volume=None):
+        self.symbol = symbol
+        self.timestamps = array("q", timestamps if timestamps is not None else [])
+        self.open = array("d", open if open is not None else [])
+        self.high = array("d", high if high is not None else [])
+        self.low = array("d", low if low is not None else [])
+        self.close = array("d", close if close is not None else [])
+        self.volume = array("q", volume if volume is not None else [])
+
+    @classmethod
+    def from_rows(cls, symbol, rows):
+        """Build a series from (date, open, high, low, close, volume) rows"""
+        series = cls(symbol)
+        for row in rows:
+            series.append(*row)
+        return series
+
+    def append(self, date, open_price, high_price, low_price, close_price, volume):
+        self.timestamps.append(to_epoch_ns(date))
+        self.open.append(open_price)
+        self.high.append(high_price)
+        self.low.append(low_price)
+        self.close.append(close_price)
+        self.volume.append(volume or 0)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        return self.record(index)
+
+    @property
+    def start(self):
+        """Datetime of the first bar"""
+        return from_epoch_ns(self.timestamps[0])
+
+    @property
+    def end(self):
+        """Datetime of the last bar"""
+        return from_epoch_ns(self.timestamps[-1])
+
+    @property
+    def nbytes(self):
+        """Bytes held by the underlying arrays"""
+        columns = (self.timestamps, self.open, self.high, self.low, self.close, self.volume)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def since(self, date):
+        """Get the bars dated on or after date as a new series"""
+        index = bisect_left(self.timestamps, to_epoch_ns(date))
+        return OHLCVSeries(
+            self.symbol,
+            self.timestamps[index:],
+            self.open[index:],
+            self.high[index:],
+            self.low[index:],
+            self.close[index:],
+            self.volume[index:]
+        )
+
+    def dates(self):
+        return [from_epoch_ns(timestamp) for timestamp in self.timestamps]
+
+    def record(self, index, include_symbol=True):
+        """Get one bar as a dict keyed like the StockData columns"""
+        bar = {
+            "date": from_epoch_ns(self.timestamps[index]),
+            "open_price": self.open[index],
+            "high_price": self.high[index],
+            "low_price": self.low[index],
+            "close_price": self.close[index],
+            "volume": self.volume[index]
+        }
+        if include_symbol:
+            bar["company_symbol"] = self.symbol
+        return bar
+
+    def to_records(self, include_symbol=True):
+        """Get every bar as a dict, for bulk inserts and JSON responses"""
+        return [
+            {"company_symbol": self.symbol, "date": from_epoch_ns(timestamp), "open_price": open_price,
+             "high_price": high_price, "low_price": low_price, "close_price": close_price, "volume": volume}
+            if include_symbol else
+            {"date": from_epoch_ns(timestamp), "open_price": open_price, "high_price": high_price,
+             "low_price": low_price, "close_price": close_price, "volume": volume}
+            for timestamp, open_price, high_price, low_price, close_price, volume
+            in zip(self.timestamps, self.open, self.high, self.low, self.close, self.volume)
+        ]
@@ -1,7 +1,10 @@
 import random
 from datetime import datetime, timedelta
-import yfinance as yf
-from database import get_db, Company, StockData
+from sqlalchemy import func
+from database import get_db, init_db, Company, StockData
+from rollups import ROLLUP_MODELS, PERIOD_START, update_rollups
+from series import OHLCVSeries
+from screener import update_summary
 
 # Sample companies with more realistic data
 SAMPLE_COMPANIES = [
@@ -79,9 +82,10 @@ SAMPLE_COMPANIES = [
     }
 ]
 
-def populate_companies():
+def populate_companies(db=None):
     """Populate the database with sample companies"""
-    db = next(get_db())
+    if db is None:
+        db = next(get_db())
     
     # Check if companies already exist
     existing_companies = db.query(Company).count()
@@ -95,39 +99,59 @@ def populate_companies():
     db.commit()
     print(f"Populated {len(SAMPLE_COMPANIES)} companies")
 
-def populate_all_stock_data():
+def rebuild_derived_data(db=None):
+    """Rebuild rollups and screener summaries for every symbol with stored bars.
+    
+    Rollups of periods only partly covered by the retained daily bars are kept.
+    """
+    if db is None:
+        db = next(get_db())
+        should_close = True
+    else:
+        should_close = False
+    
+    try:
+        for symbol, first_date in db.query(StockData.company_symbol, func.min(StockData.date)).group_by(StockData.company_symbol).all():
+            update_rollups(db, symbol, first_date, keep_retained=True)
+            update_summary(db, symbol)
+            db.commit()
+    finally:
+        if should_close:
+            db.close()
+
+def seed_database(db):
+    """Seed companies and bring tables derived from stock_data up to date"""
+    populate_companies(db)
+    rebuild_derived_data(db)
+
+def initialize_database():
+    """Create the schema and seed the sample companies unless already done"""
+    init_db(seed=seed_database)
+
+def populate_all_stock_data(workers=None):
     """Populate stock data for all companies and all time periods"""
+    # Imported here because the backfill engine builds on this module
+    from backfill import backfill
+    
     # Get all companies
     db = next(get_db())
     companies = db.query(Company).all()
     db.close()
     
-    # Define time periods in days
-    time_periods = [
-        90,    # 3 months
-        180,   # 6 months
-        365,   # 1 year
-        730,   # 2 years
-        1095,  # 3 years
-        1825   # 5 years
-    ]
-    
     print("Starting to populate stock data for all time periods...")
     
-    # Process companies one by one to avoid connection pool issues
-    for company in companies:
-        print(f"Processing {company.symbol}...")
-        for days in time_periods:
-            try:
-                # Use separate database session for each operation
-                force_populate_stock_data(company.symbol, days)
-            except Exception as e:
-                print(f"Error populating data for {company.symbol} ({days} days): {e}")
+    # Bars are stored daily and every shorter period is a suffix of the 5 year
+    # window, so one 5 year backfill per company covers all time periods.
+    # Fetching is sharded across worker processes with a single writer.
+    result = backfill([company.symbol for company in companies], days=1825, workers=workers)
+    for symbol, error in result["failed"].items():
+        print(f"Error populating data for {symbol}: {error}")
     
     print("Finished populating stock data for all time periods")
+    return result
 
 def generate_mock_stock_data(symbol, days=30):
-    """Generate realistic mock stock data for a given symbol and number of days"""
+    """Generate realistic mock stock data for a given symbol and number of days as an OHLCVSeries"""
     # Base prices for different companies (more realistic)
     base_prices = {
         "AAPL": 150.0,
@@ -146,59 +170,34 @@ def generate_mock_stock_data(symbol, days=30):
     
     base_price = base_prices.get(symbol, 100.0)
     current_price = base_price
-    data = []
+    data = OHLCVSeries(symbol)
     
-    # Generate data points based on the time range
+    # Generate daily data points for every time range; weekly and monthly
+    # views are served from the rollup tables maintained on ingest
     if days <= 7:
-        # For 1 week, generate daily data
         data_points = days
         volatility = 0.02  # 2% daily volatility
-        interval_type = "daily"
     elif days <= 30:
-        # For 1 month, generate daily data
         data_points = days
         volatility = 0.015  # 1.5% daily volatility
-        interval_type = "daily"
     elif days <= 90:
-        # For 3 months, generate daily data
         data_points = days
         volatility = 0.012  # 1.2% daily volatility
-        interval_type = "daily"
     elif days <= 180:
-        # For 6 months, generate daily data
         data_points = days
         volatility = 0.011  # 1.1% daily volatility
-        interval_type = "daily"
     elif days <= 365:
-        # For 1 year, generate daily data
         data_points = days
         volatility = 0.01  # 1% daily volatility
-        interval_type = "daily"
-    elif days <= 730:
-        # For 2 years, generate weekly data
-        data_points = min(days // 7, 104)  # ~104 weeks
-        volatility = 0.025  # 2.5% weekly volatility
-        interval_type = "weekly"
-    elif days <= 1095:
-        # For 3 years, generate weekly data
-        data_points = min(days // 7, 156)  # ~156 weeks
-        volatility = 0.03  # 3% weekly volatility
-        interval_type = "weekly"
     else:
-        # For 5 years, generate weekly data
-        data_points = min(days // 7, 260)  # ~260 weeks
-        volatility = 0.035  # 3.5% weekly volatility
-        interval_type = "weekly"
+        # For multi-year periods, cover the same window as get_start_date
+        data_points = min(days // 7, 260) * 7
+        volatility = 0.01  # 1% daily volatility
     
     end_date = datetime.now()
     
     for i in range(data_points):
-        if interval_type == "weekly":
-            # For longer periods, use weekly intervals
-            date = end_date - timedelta(weeks=data_points - i)
-        else:
-            # For shorter periods, use daily intervals
-            date = end_date - timedelta(days=data_points - i)
+        date = end_date - timedelta(days=data_points - i)
         
         # Generate price movement with trend
         change_percent = random.gauss(0, volatility)
@@ -206,7 +205,7 @@ def generate_mock_stock_data(symbol, days=30):
         # Add some trend for longer periods
         if days > 365:
             # Add slight upward trend for longer periods
-            trend = 0.0005  # 0.05% weekly trend
+            trend = 0.0001  # 0.01% daily trend
             change_percent += trend
         
         current_price *= (1 + change_percent)
@@ -215,10 +214,7 @@ def generate_mock_stock_data(symbol, days=30):
         current_price = max(current_price, base_price * 0.1)
         
         # Generate OHLC data
-        if interval_type == "weekly":
-            daily_volatility = volatility * 0.3  # Lower for weekly data
-        else:
-            daily_volatility = volatility * 0.5
+        daily_volatility = volatility * 0.5
         
         open_price = current_price * (1 + random.gauss(0, daily_volatility))
         high_price = max(open_price, current_price) * (1 + abs(random.gauss(0, daily_volatility)))
@@ -230,21 +226,23 @@ def generate_mock_stock_data(symbol, days=30):
         volume_multiplier = random.uniform(0.5, 2.0)
         volume = int(base_volume * volume_multiplier * (1 + abs(change_percent) * 10))
         
-        data.append({
-            "company_symbol": symbol,
-            "date": date,  # Return datetime object instead of string
-            "open_price": round(open_price, 2),
-            "high_price": round(high_price, 2),
-            "low_price": round(low_price, 2),
-            "close_price": round(close_price, 2),
-            "volume": volume
-        })
+        data.append(
+            date,
+            round(open_price, 2),
+            round(high_price, 2),
+            round(low_price, 2),
+            round(close_price, 2),
+            volume
+        )
     
     return data
 
 def fetch_live_stock_data(symbol, days=30):
-    """Fetch live stock data using yfinance"""
+    """Fetch live stock data using yfinance as an OHLCVSeries"""
     try:
+        # Imported on first use: yfinance pulls in pandas, which dominates startup time
+        import yfinance as yf
+        
         ticker = yf.Ticker(symbol)
         
         # Determine the period based on days
@@ -270,61 +268,126 @@ def fetch_live_stock_data(symbol, days=30):
         if hist.empty:
             return None
         
-        data = []
-        for date, row in hist.iterrows():
-                    data.append({
-            "company_symbol": symbol,
-            "date": date,  # Return datetime object instead of string
-            "open_price": round(float(row['Open']), 2),
-            "high_price": round(float(row['High']), 2),
-                "low_price": round(float(row['Low']), 2),
-                "close_price": round(float(row['Close']), 2),
-                "volume": int(row['Volume'])
-            })
-        
-        return data
+        # Copy whole columns instead of iterating rows; timestamps keep the
+        # exchange's wall-clock time, as SQLite stores it
+        return OHLCVSeries(
+            symbol,
+            timestamps=hist.index.tz_localize(None).asi8.tolist(),
+            open=hist['Open'].round(2).tolist(),
+            high=hist['High'].round(2).tolist(),
+            low=hist['Low'].round(2).tolist(),
+            close=hist['Close'].round(2).tolist(),
+            volume=hist['Volume'].astype('int64').tolist()
+        )
     except Exception as e:
         print(f"Error fetching live data for {symbol}: {e}")
         return None
 
-def populate_stock_data(symbol, days=30):
-    """Populate stock data for a company"""
-    db = next(get_db())
-    
-    # Check if data already exists for this symbol and time range
-    end_date = datetime.now()
+def get_start_date(days, end_date=None):
+    """Get the start of the time window covered by a request for the given number of days"""
+    if end_date is None:
+        end_date = datetime.now()
     if days > 365:
-        start_date = end_date - timedelta(weeks=min(days // 7, 260))
+        return end_date - timedelta(weeks=min(days // 7, 260))
+    return end_date - timedelta(days=days)
+
+def get_resolution(days):
+    """Pick the bar resolution served for a time range: daily up to a year, weekly beyond"""
+    return "daily" if days <= 365 else "weekly"
+
+def get_expected_data_points(days, resolution):
+    """Get the number of bars a fully populated time range holds at the given resolution"""
+    if resolution == "weekly":
+        return min(days // 7, 260) if days > 365 else max(days // 7, 1)
+    if resolution == "monthly":
+        return max(days // 30, 1)
+    return days
+
+def query_stock_data(db, symbol, start_date, resolution="daily", columns=False):
+    """Build a date-ordered query over the daily table or one of the rollup tables.
+    
+    With columns=True the query yields plain (date, open, high, low, close,
+    volume) rows instead of ORM instances.
+    """
+    if resolution == "daily":
+        model = StockData
+    else:
+        model = ROLLUP_MODELS[resolution]
+        # Include the partial period the window starts in
+        start_date = PERIOD_START[resolution](start_date)
+    
+    if columns:
+        query = db.query(model.date, model.open_price, model.high_price, model.low_price, model.close_price, model.volume)
     else:
-        start_date = end_date - timedelta(days=days)
+        query = db.query(model)
+    
+    return query.filter(
+        model.company_symbol == symbol,
+        model.date >= start_date
+    ).order_by(model.date)
+
+def window_start(start_date):
+    """Midnight of start_date's calendar day, where a replaced window of bars begins.
     
-    existing_data = db.query(StockData).filter(
+    Bars carry their time of day, so cutting at start_date itself would leave
+    an old bar on the boundary day next to the new one.
+    """
+    return datetime(start_date.year, start_date.month, start_date.day)
+
+def store_stock_data(db, symbol, series, start_date=None):
+    """Add a company's daily OHLCVSeries and bring its weekly/monthly rollups up to date.
+    
+    With start_date, bars before the window cleared by clear_stock_data are
+    dropped; data sources can return more history than was asked for.
+    """
+    if start_date is not None:
+        series = series.since(window_start(start_date))
+    if not series:
+        return
+    db.bulk_insert_mappings(StockData, series.to_records())
+    update_rollups(db, symbol, series.start)
+    update_summary(db, symbol)
+
+def clear_stock_data(db, symbol, start_date):
+    """Delete daily bars for a company from start_date's calendar day onwards and rebuild the affected rollups and summary"""
+    start_date = window_start(start_date)
+    db.query(StockData).filter(
         StockData.company_symbol == symbol,
         StockData.date >= start_date
-    ).count()
+    ).delete()
+    update_rollups(db, symbol, start_date)
+    update_summary(db, symbol)
+
+def populate_stock_data(symbol, days=30, resolution=None):
+    """Populate stock data for a company"""
+    db = next(get_db())
+    
+    if resolution is None:
+        resolution = get_resolution(days)
     
-    # For longer periods, we expect fewer data points (weekly vs daily)
-    expected_data_points = days if days <= 365 else min(days // 7, 260)
+    # Check if data already exists for this symbol and time range
+    start_date = get_start_date(days)
+    existing_data = query_stock_data(db, symbol, start_date, resolution).count()
+    expected_data_points = get_expected_data_points(days, resolution)
     
     if existing_data >= expected_data_points * 0.8:  # If we have 80% of expected data
         print(f"Data already exists for {symbol} ({days} days) - {existing_data} points")
         return
     
+    # Replace any partial data in the window so bars aren't stored twice
+    clear_stock_data(db, symbol, start_date)
+    
     # Try to fetch live data first
     live_data = fetch_live_stock_data(symbol, days)
     
     if live_data:
         # Use live data
-        for data_point in live_data:
-            stock_data = StockData(**data_point)
-            db.add(stock_data)
+        store_stock_data(db, symbol, live_data, start_date)
         print(f"Populated live stock data for {symbol} ({days} days) - {len(live_data)} points")
     else:
         # Use mock data
         mock_data = generate_mock_stock_data(symbol, days)
-        for data_point in mock_data:
-            stock_data = StockData(**data_point)
-            db.add(stock_data)
+        store_stock_data(db, symbol, mock_data, start_date)
         print(f"Populated mock stock data for {symbol} ({days} days) - {len(mock_data)} points")
     
     db.commit()
@@ -335,17 +398,8 @@ def force_populate_stock_data(symbol, days=30):
     
     try:
         # Clear existing data for this symbol and time range
-        end_date = datetime.now()
-        if days > 365:
-            start_date = end_date - timedelta(weeks=min(days // 7, 260))
-        else:
-            start_date = end_date - timedelta(days=days)
-        
-        # Delete existing data
-        db.query(StockData).filter(
-            StockData.company_symbol == symbol,
-            StockData.date >= start_date
-        ).delete()
+        start_date = get_start_date(days)
+        clear_stock_data(db, symbol, start_date)
         db.commit()
         
         # Try to fetch live data first
@@ -353,16 +407,12 @@ def force_populate_stock_data(symbol, days=30):
         
         if live_data:
             # Use live data
-            for data_point in live_data:
-                stock_data = StockData(**data_point)
-                db.add(stock_data)
+            store_stock_data(db, symbol, live_data, start_date)
             print(f"Force populated live stock data for {symbol} ({days} days) - {len(live_data)} points")
         else:
             # Use mock data
             mock_data = generate_mock_stock_data(symbol, days)
-            for data_point in mock_data:
-                stock_data = StockData(**data_point)
-                db.add(stock_data)
+            store_stock_data(db, symbol, mock_data, start_date)
             print(f"Force populated mock stock data for {symbol} ({days} days) - {len(mock_data)} points")
         
         db.commit()
@@ -379,17 +429,8 @@ def force_populate_stock_data_with_session(symbol, days=30, db=None):
     
     try:
         # Clear existing data for this symbol and time range
-        end_date = datetime.now()
-        if days > 365:
-            start_date = end_date - timedelta(weeks=min(days // 7, 260))
-        else:
-            start_date = end_date - timedelta(days=days)
-        
-        # Delete existing data
-        db.query(StockData).filter(
-            StockData.company_symbol == symbol,
-            StockData.date >= start_date
-        ).delete()
+        start_date = get_start_date(days)
+        clear_stock_data(db, symbol, start_date)
         db.commit()
         
         # Try to fetch live data first
@@ -397,16 +438,12 @@ def force_populate_stock_data_with_session(symbol, days=30, db=None):
         
         if live_data:
             # Use live data
-            for data_point in live_data:
-                stock_data = StockData(**data_point)
-                db.add(stock_data)
+            store_stock_data(db, symbol, live_data, start_date)
             print(f"Force populated live stock data for {symbol} ({days} days) - {len(live_data)} points")
         else:
             # Use mock data
             mock_data = generate_mock_stock_data(symbol, days)
-            for data_point in mock_data:
-                stock_data = StockData(**data_point)
-                db.add(stock_data)
+            store_stock_data(db, symbol, mock_data, start_date)
             print(f"Force populated mock stock data for {symbol} ({days} days) - {len(mock_data)} points")
         
         db.commit()
@@ -414,38 +451,37 @@ def force_populate_stock_data_with_session(symbol, days=30, db=None):
         if should_close:
             db.close()
 
-def get_stock_data(symbol, days=30):
-    """Get stock data for a company"""
+def get_stock_series(symbol, days=30, resolution=None):
+    """Get stock data for a company as an OHLCVSeries.
+    
+    Ranges up to a year are served from the daily table; longer ranges read
+    the weekly rollup (~260 rows for 5 years instead of ~1,260 daily bars)
+    unless a resolution of "daily", "weekly" or "monthly" is given explicitly.
+    """
     db = next(get_db())
     
+    if resolution is None:
+        resolution = get_resolution(days)
+    
     # Calculate the start date based on days
-    end_date = datetime.now()
-    if days > 365:
-        start_date = end_date - timedelta(weeks=min(days // 7, 260))
-    else:
-        start_date = end_date - timedelta(days=days)
+    start_date = get_start_date(days)
     
-    # Get existing data
-    data = db.query(StockData).filter(
-        StockData.company_symbol == symbol,
-        StockData.date >= start_date
-    ).order_by(StockData.date).all()
+    # Get existing data as plain column rows rather than ORM instances
+    data = OHLCVSeries.from_rows(symbol, query_stock_data(db, symbol, start_date, resolution, columns=True))
     
-    # For longer periods, we expect fewer data points (weekly vs daily)
-    expected_data_points = days if days <= 365 else min(days // 7, 260)
+    expected_data_points = get_expected_data_points(days, resolution)
     
     # If no data exists or data is insufficient, populate it
     if len(data) < expected_data_points * 0.8:  # If we have less than 80% of expected data
-        populate_stock_data(symbol, days)
+        populate_stock_data(symbol, days, resolution)
         # Fetch the data again
-        data = db.query(StockData).filter(
-            StockData.company_symbol == symbol,
-            StockData.date >= start_date
-        ).order_by(StockData.date).all()
-    
-    return [{"date": item.date, "open_price": item.open_price, "high_price": item.high_price, 
-             "low_price": item.low_price, "close_price": item.close_price, "volume": item.volume} 
-            for item in data]
+        data = OHLCVSeries.from_rows(symbol, query_stock_data(db, symbol, start_date, resolution, columns=True))
+    
+    return data
+
+def get_stock_data(symbol, days=30, resolution=None):
+    """Get stock data for a company as a list of dicts for JSON responses"""
+    return get_stock_series(symbol, days, resolution).to_records(include_symbol=False)
 
 def test_data_generation():
     """Test function to verify data generation is working"""